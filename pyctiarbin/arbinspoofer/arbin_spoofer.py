@@ -1,14 +1,25 @@
 import socket
 import threading
 import struct
-import copy
-from pyctiarbin.messages import Msg, MessageABC
+import functools
+import queue
+from pyctiarbin.messages import Msg, MessageABC, MAX_MSG_LENGTH
+
+
+@functools.lru_cache(maxsize=1024)
+def _channel_response_msg(server_msg: MessageABC, channel: int) -> bytes:
+    '''
+    Packs a server response that only echoes back the channel. These responses are the same
+    for every request on a channel, so they are packed once and reused.
+    '''
+    return bytes(server_msg.pack({'channel': channel}))
 
 
 class ChannelData:
 
-    __chan_readings_list = []
-    __chan_readings_lock = threading.Lock()
+    # Names of the readings that can be stored for a channel.
+    __valid_reading_keys = frozenset(
+        Msg.ChannelInfo.Server.msg_specific_template)
 
     def __init__(self, num_channels):
         """
@@ -20,16 +31,16 @@ class ChannelData:
                 Number of channels in our hypothetical Arbin cycler.
         """
         self.num_channels = num_channels
+        # One lock per channel so workers serving different channels do not contend.
+        self.__chan_readings_locks = [
+            threading.Lock() for _ in range(self.num_channels)]
 
-        # Create channel_readings for all of the channels.
-        for i in range(0, self.num_channels):
-            channel_readings = {}
-            for key, item in Msg.ChannelInfo.Server.msg_specific_template.items():
-                channel_readings[key] = copy.deepcopy(item['value'])
-            channel_readings['channel'] = i
-            with self.__chan_readings_lock:
-                self.__chan_readings_list.append(
-                    copy.deepcopy(channel_readings))
+        # Create channel_readings for all of the channels. The template values are all
+        # immutable numbers and strings, so each channel can share them without copying.
+        default_readings = {
+            key: item['value'] for key, item in Msg.ChannelInfo.Server.msg_specific_template.items()}
+        self.__chan_readings_list = [
+            {**default_readings, 'channel': i} for i in range(self.num_channels)]
 
     def fetch_channel_readings(self, channel) -> dict:
         """
@@ -43,13 +54,14 @@ class ChannelData:
         Returns
         -------
         status : dict
-            The status message for the requested channel. Empty if channel larger than number of channel
+            The status message for the requested channel. Empty if the channel does not exist.
         """
-        if channel > self.num_channels:
+        if not 0 <= channel < self.num_channels:
             return {}
         else:
-            with self.__chan_readings_lock:
-                return copy.deepcopy(self.__chan_readings_list[channel])
+            with self.__chan_readings_locks[channel]:
+                # Readings are all immutable values, so a shallow copy is enough.
+                return self.__chan_readings_list[channel].copy()
 
     def update_channel_readings(self, channel, updated_readings):
         """
@@ -67,16 +79,15 @@ class ChannelData:
         success : bool
             Returns True if all values in the updated_status were used to update the channel_status_array.
         """
-        if channel > self.num_channels:
+        if not 0 <= channel < self.num_channels:
             return False
         else:
-            for key in updated_readings.keys():
-                if key not in Msg.ChannelInfo.Server.msg_specific_template.keys():
-                    return False
+            if not updated_readings.keys() <= self.__valid_reading_keys:
+                return False
 
-            with self.__chan_readings_lock:
-                for key in updated_readings.keys():
-                    self.__chan_readings_list[channel][key] = updated_readings[key]
+            with self.__chan_readings_locks[channel]:
+                self.__chan_readings_list[channel].update(updated_readings)
+            return True
 
 
 class SocketWorker:
@@ -90,7 +101,17 @@ class SocketWorker:
     __stop_lock = threading.Lock()
     __stop = False
 
-    def __init__(self, s: socket.socket, channel_data: ChannelData):
+    # Structs for peeking at the message length and command code of received messages,
+    # compiled once from the prefix shared by all messages.
+    __msg_length_struct = struct.Struct(
+        MessageABC.base_template['msg_length']['format'])
+    __msg_length_start_byte = MessageABC.base_template['msg_length']['start_byte']
+    __cmd_code_struct = struct.Struct(
+        MessageABC.base_template['command_code']['format'])
+    __cmd_code_start_byte = MessageABC.base_template['command_code']['start_byte']
+
+    def __init__(self, s: socket.socket, channel_data: ChannelData,
+                 finished_workers: queue.SimpleQueue = None):
         """
         Creates the thread to service client requests.
 
@@ -98,8 +119,16 @@ class SocketWorker:
         ----------
         s : socket.socket
             Socket connection to client.
+        channel_data : ChannelData
+            The channel data to respond with.
+        finished_workers : queue.SimpleQueue
+            Optional queue the worker puts itself on once its service loop has finished.
         """
         self.__channel_data = channel_data
+        self.__finished_workers = finished_workers
+        # The login response only depends on the number of channels, so pack it once.
+        self.__login_response_msg = Msg.Login.Server.pack(
+            {'num_channels': channel_data.num_channels})
 
         self.stop = False
         self.__client_thread = threading.Thread(
@@ -122,31 +151,111 @@ class SocketWorker:
         """
         s.settimeout(self.__receive_msg_timeout_s)
 
-        rx_msg_length_format = MessageABC.base_template['msg_length']['format']
-        rx_msg_length_start_byte = MessageABC.base_template['msg_length']['start_byte']
-        rx_msg_length_end_byte = MessageABC.base_template['msg_length']['start_byte'] + struct.calcsize(
-            rx_msg_length_format)
+        # Bind the per-message calls once rather than looking them up on every message.
+        receive_msg = self.__receive_msg
+        process_client_msg = self.__process_client_msg
+        sendall = s.sendall
 
-        while True:
-            try:
-                rx_msg = s.recv(self.__msg_buffer_size_bytes)
-                if not rx_msg:
-                    break
+        try:
+            while True:
+                try:
+                    rx_msg = receive_msg(s)
+                    if not rx_msg:
+                        break
 
-                # Keep reading message in pieces until rx_msg is as long as expected_rx_msg_len
-                expected_rx_msg_len = struct.unpack(
-                    rx_msg_length_format, rx_msg[rx_msg_length_start_byte:rx_msg_length_end_byte])[0]
-                while len(rx_msg) < expected_rx_msg_len:
-                    rx_msg += s.recv(self.__msg_buffer_size_bytes)
+                    tx_msg = process_client_msg(rx_msg)
 
-                tx_msg = self.__process_client_msg(rx_msg)
+                    sendall(tx_msg)
+                except socket.timeout:
+                    with self.__stop_lock:
+                        if self.__stop:
+                            break
+        finally:
+            s.close()
+            if self.__finished_workers is not None:
+                self.__finished_workers.put(self)
 
-                s.sendall(tx_msg)
-            except socket.timeout:
-                with self.__stop_lock:
-                    if self.__stop:
-                        break
-        s.close()
+    def __receive_msg(self, s: socket.socket):
+        """
+        Receives a single client message. The message length is read from the first chunk
+        received, and the rest of the message is read straight into a buffer sized for it.
+
+        Parameters
+        ----------
+        s : socket.socket
+            Socket connection to client.
+
+        Returns
+        -------
+        rx_msg : bytes or bytearray
+            The received message. Empty if the client closed the connection or sent an
+            invalid message length.
+        """
+        msg_buffer_size_bytes = self.__msg_buffer_size_bytes
+
+        rx_msg = s.recv(msg_buffer_size_bytes)
+        if not rx_msg:
+            return rx_msg
+
+        expected_rx_msg_len = self.__msg_length_struct.unpack_from(
+            rx_msg, self.__msg_length_start_byte)[0]
+        # Drop the client on a corrupt length header rather than sizing a buffer from it.
+        if expected_rx_msg_len > MAX_MSG_LENGTH:
+            return bytearray([])
+        if len(rx_msg) >= expected_rx_msg_len:
+            return rx_msg
+
+        # Keep reading message in pieces until it is as long as expected_rx_msg_len. Leave room
+        # for a full chunk past the expected length, as messages can run past msg_length.
+        rx_buf = bytearray(expected_rx_msg_len + msg_buffer_size_bytes)
+        rx_len = len(rx_msg)
+        rx_buf[:rx_len] = rx_msg
+        rx_view = memoryview(rx_buf)
+        recv_into = s.recv_into
+        while rx_len < expected_rx_msg_len:
+            num_bytes = recv_into(rx_view[rx_len:], msg_buffer_size_bytes)
+            if not num_bytes:
+                return bytearray([])
+            rx_len += num_bytes
+        rx_view.release()
+
+        del rx_buf[rx_len:]
+        return rx_buf
+
+    def __login_response(self, server_msg: MessageABC, rx_msg_dict: dict) -> bytes:
+        """
+        Response to a login message, packed when the worker was created.
+        """
+        return self.__login_response_msg
+
+    def __channel_info_response(self, server_msg: MessageABC, rx_msg_dict: dict) -> bytes:
+        """
+        Response to a channel info message: the current readings of the requested channel.
+        """
+        return server_msg.pack(
+            self.__channel_data.fetch_channel_readings(rx_msg_dict['channel']))
+
+    def __channel_response(self, server_msg: MessageABC, rx_msg_dict: dict) -> bytes:
+        """
+        Response that just echoes back the channel of the client message.
+        """
+        return _channel_response_msg(server_msg, rx_msg_dict['channel'])
+
+    # Client message, server response message and response function for each command code.
+    __msg_handlers = {
+        Msg.Login.Client.command_code:
+            (Msg.Login.Client, Msg.Login.Server, __login_response),
+        Msg.ChannelInfo.Client.command_code:
+            (Msg.ChannelInfo.Client, Msg.ChannelInfo.Server, __channel_info_response),
+        Msg.AssignSchedule.Client.command_code:
+            (Msg.AssignSchedule.Client, Msg.AssignSchedule.Server, __channel_response),
+        Msg.StartSchedule.Client.command_code:
+            (Msg.StartSchedule.Client, Msg.StartSchedule.Server, __channel_response),
+        Msg.StopSchedule.Client.command_code:
+            (Msg.StopSchedule.Client, Msg.StopSchedule.Server, __channel_response),
+        Msg.SetMetaVariable.Client.command_code:
+            (Msg.SetMetaVariable.Client, Msg.SetMetaVariable.Server, __channel_response),
+    }
 
     def __process_client_msg(self, rx_msg):
         """
@@ -164,39 +273,16 @@ class SocketWorker:
         """
 
         # Determine command code to sort message
-        cmd_code_format = MessageABC.base_template['command_code']['format']
-        cmd_code_start_byte = MessageABC.base_template['command_code']['start_byte']
-        cmd_code_end_byte = MessageABC.base_template['command_code']['start_byte'] + + struct.calcsize(
-            cmd_code_format)
-        cmd_code = struct.unpack(
-            cmd_code_format, rx_msg[cmd_code_start_byte:cmd_code_end_byte])[0]
-
-        if cmd_code == Msg.Login.Client.command_code:
-            rx_msg_dict = Msg.Login.Client.unpack(rx_msg)
-            tx_msg = Msg.Login.Server.pack({'num_channels':self.__channel_data.num_channels})
-        elif cmd_code == Msg.ChannelInfo.Client.command_code:
-            rx_msg_dict = Msg.ChannelInfo.Client.unpack(rx_msg)
-            channel_values = self.__channel_data.fetch_channel_readings(
-                rx_msg_dict['channel'])
-            tx_msg = Msg.ChannelInfo.Server.pack(channel_values)
-        elif cmd_code == Msg.AssignSchedule.Client.command_code:
-            rx_msg_dict = Msg.AssignSchedule.Client.unpack(rx_msg)
-            tx_msg = Msg.AssignSchedule.Server.pack(
-                {'channel': rx_msg_dict['channel']})
-        elif cmd_code == Msg.StartSchedule.Client.command_code:
-            rx_msg_dict = Msg.StartSchedule.Client.unpack(rx_msg)
-            tx_msg = Msg.StartSchedule.Server.pack(
-                {'channel': rx_msg_dict['channel']})
-        elif cmd_code == Msg.StopSchedule.Client.command_code:
-            rx_msg_dict = Msg.StopSchedule.Client.unpack(rx_msg)
-            tx_msg = Msg.StopSchedule.Server.pack(
-                {'channel': rx_msg_dict['channel']})
-        elif cmd_code == Msg.SetMetaVariable.Client.command_code:
-            rx_msg_dict = Msg.SetMetaVariable.Client.unpack(rx_msg)
-            tx_msg = Msg.SetMetaVariable.Server.pack(
-                {'channel': rx_msg_dict['channel']})
-        else:
-            tx_msg = bytearray([])
+        cmd_code = self.__cmd_code_struct.unpack_from(
+            rx_msg, self.__cmd_code_start_byte)[0]
+
+        handler = self.__msg_handlers.get(cmd_code)
+        if handler is None:
+            return bytearray([])
+
+        client_msg, server_msg, response = handler
+        rx_msg_dict = client_msg.unpack(rx_msg)
+        tx_msg = response(self, server_msg, rx_msg_dict)
 
         return tx_msg
 
@@ -287,8 +373,10 @@ class ArbinSpoofer:
         Worker : SocketWorker
             A reference to the worker class that will service individual client connections.
         """
-        # List that will hold all the workers to service client connections.
-        client_workers = []
+        # Set that will hold all the workers to service client connections. Workers put
+        # themselves on finished_workers when their client disconnects.
+        client_workers = set()
+        finished_workers = queue.SimpleQueue()
 
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -299,8 +387,8 @@ class ArbinSpoofer:
         while True:
             try:
                 client_connection = sock.accept()[0]
-                client_workers.append(
-                    Worker(client_connection, self.__channel_data))
+                client_workers.add(
+                    Worker(client_connection, self.__channel_data, finished_workers))
             except socket.timeout:
                 with self.__stop_servers_lock:
                     # If stop command is issued then kill all workers.
@@ -309,10 +397,9 @@ class ArbinSpoofer:
                             if worker.is_alive():
                                 worker.kill_worker()
                         break
-                # Remove any workers that made have died from disconnecting clients.
-                client_workers[:] = [
-                    worker for worker in client_workers if worker.is_alive()
-                ]
+                # Remove any workers that have finished from disconnecting clients.
+                while not finished_workers.empty():
+                    client_workers.discard(finished_workers.get_nowait())
 
         sock.close()
 
@@ -1,10 +1,9 @@
 import logging
 import os
-from pydantic import BaseModel
-from pydantic import field_validator
+from dataclasses import dataclass
 from .messages import Msg
 
-from .cycler_interface import CyclerInterface
+from .cycler_interface import CyclerInterface, _ConfigFromDict
 
 logger = logging.getLogger(__name__)
 
@@ -41,8 +40,19 @@ class ChannelInterface(CyclerInterface):
             The path to the `.env` file containing the Arbin CTI username,`ARBIN_CTI_USERNAME`, and password, `ARBIN_CTI_PASSWORD`.
             Defaults to looking in the working directory.
         """
-        self.__config = ChannelInterfaceConfig(**config)
-        super().__init__(self.__config.model_dump(), env_path)
+        self.__config = ChannelInterfaceConfig.from_dict(config)
+        super().__init__(config, env_path)
+
+        # The channel, schedule and test names are fixed for the life of the interface, so the
+        # assign schedule, start test and stop test messages are packed once and reused.
+        if self.__config.schedule_name:
+            self.__assign_schedule_msg_tx_bin = Msg.AssignSchedule.Client.pack(
+                {'channel': self.__config.channel, 'schedule': self.__config.schedule_name})
+        if self.__config.test_name:
+            self.__start_test_msg_tx_bin = Msg.StartSchedule.Client.pack(
+                {'channel': self.__config.channel, 'test_name': self.__config.test_name})
+        self.__stop_test_msg_tx_bin = Msg.StopSchedule.Client.pack(
+            {'channel': self.__config.channel})
 
     def read_channel_status(self) -> dict:
         """
@@ -71,10 +81,8 @@ class ChannelInterface(CyclerInterface):
             logger.error("Schedule name undefined!")
             return success
 
-        assign_schedule_msg_tx_bin = Msg.AssignSchedule.Client.pack(
-            {'channel': self.__config.channel, 'schedule': self.__config.schedule_name})
         response_msg_bin = self._send_receive_msg(
-            assign_schedule_msg_tx_bin)
+            self.__assign_schedule_msg_tx_bin)
 
         if response_msg_bin:
             assign_schedule_msg_rx_dict = Msg.AssignSchedule.Server.unpack(
@@ -107,9 +115,8 @@ class ChannelInterface(CyclerInterface):
 
         # Make sure the schedule is assigned before starting the test to avoid any funny business
         if self.assign_schedule():
-            start_test_msg_tx_bin = Msg.StartSchedule.Client.pack(
-                {'channel': self.__config.channel, 'test_name': self.__config.test_name})
-            response_msg_bin = self._send_receive_msg(start_test_msg_tx_bin)
+            response_msg_bin = self._send_receive_msg(
+                self.__start_test_msg_tx_bin)
 
             if response_msg_bin:
                 start_test_msg_rx_dict = Msg.StartSchedule.Server.unpack(
@@ -137,10 +144,8 @@ class ChannelInterface(CyclerInterface):
         """
         success = False
 
-        stop_test_msg_tx_bin = Msg.StopSchedule.Client.pack(
-            {'channel': self.__config.channel})
         response_msg_bin = self._send_receive_msg(
-            stop_test_msg_tx_bin)
+            self.__stop_test_msg_tx_bin)
 
         if response_msg_bin:
             stop_test_msg_rx_dict = Msg.StopSchedule.Server.unpack(
@@ -174,12 +179,10 @@ class ChannelInterface(CyclerInterface):
         """
         success = False
 
-        updated_msg_vals = {}
-        updated_msg_vals['channel'] = self.__config.channel
-        updated_msg_vals['mv_meta_code'] = Msg.SetMetaVariable.Client.mv_channel_codes[mv_num]
-        updated_msg_vals['mv_data'] = mv_value
-
-        set_mv_msg_tx_bin = Msg.SetMetaVariable.Client.pack(updated_msg_vals)
+        set_mv_msg_tx_bin = Msg.SetMetaVariable.Client.pack({
+            'channel': self.__config.channel,
+            'mv_meta_code': Msg.SetMetaVariable.Client.mv_channel_codes[mv_num],
+            'mv_data': mv_value})
         response_msg_bin = self._send_receive_msg(
             set_mv_msg_tx_bin)
 
@@ -197,7 +200,9 @@ class ChannelInterface(CyclerInterface):
 
         return success
 
-class ChannelInterfaceConfig(BaseModel):
+
+@dataclass
+class ChannelInterfaceConfig(_ConfigFromDict):
     '''
     Holds channel config information for the CyclerInterface class.
 
@@ -220,15 +225,19 @@ class ChannelInterfaceConfig(BaseModel):
             A minimum of 1024 bytes is recommended. Defaults to 4096 bytes. 
     '''
     channel: int
-    test_name: str = None
-    schedule_name: str = None
     ip_address: str
     port: int
+    test_name: str = None
+    schedule_name: str = None
     timeout_s: float = 3.0
     msg_buffer_size: int = 4096
 
-    @field_validator('channel')
-    def username_alphanumeric(cls, v):
-        if v < 1:
+    def __post_init__(self):
+        # Channels are passed in one indexed but stored zero indexed.
+        self.channel = int(self.channel)
+        if self.channel < 1:
             raise ValueError('Channel must be greater than zero!')
-        return v-1
\ No newline at end of file
+        self.channel -= 1
+        self.port = int(self.port)
+        self.timeout_s = float(self.timeout_s)
+        self.msg_buffer_size = int(self.msg_buffer_size)
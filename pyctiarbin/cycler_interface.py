@@ -1,20 +1,47 @@
 import socket
 import logging
+import threading
 import struct
+import functools
 import dotenv
 import os
-from pydantic import BaseModel
+from dataclasses import dataclass, fields
 from .messages import Msg
 from .messages import MessageABC
+from .messages import MAX_MSG_LENGTH, MIN_SERVER_MSG_LENGTH
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _load_env_credentials(env_path: str) -> tuple:
+    '''
+    Reads the Arbin CTI username and password from the passed `.env` file, without touching
+    the process environment. Each file is only read once per process, however many
+    interfaces are created with it.
+
+    Returns
+    -------
+    credentials : tuple
+        The `ARBIN_CTI_USERNAME` and `ARBIN_CTI_PASSWORD` values in the file, None for any
+        that are not set.
+    '''
+    logger.info(f'Loading Arbin CTI credentials from {env_path}')
+    env_values = dotenv.dotenv_values(env_path)
+    return (env_values.get('ARBIN_CTI_USERNAME'), env_values.get('ARBIN_CTI_PASSWORD'))
+
+
 class CyclerInterface:
     """
     Class for interfacing with Arbin battery cycler at a cycler level.
     """
 
+    # Struct for peeking at the message length of received messages, compiled once from the
+    # prefix shared by all messages.
+    __msg_length_struct = struct.Struct(
+        MessageABC.base_template['msg_length']['format'])
+    __msg_length_start_byte = MessageABC.base_template['msg_length']['start_byte']
+
     def __init__(self, config: dict, env_path: str = os.path.join(os.getcwd(), '.env')):
         """
         Creates a class instance for interfacing with Arbin battery cycler at a cycler level.
@@ -36,10 +63,17 @@ class CyclerInterface:
             The path to the `.env` file containing the Arbin CTI username,`ARBIN_CTI_USERNAME`, and password, `ARBIN_CTI_PASSWORD`.
             Defaults to looking in the working directory.
         """
-        self.__config = CyclerInterfaceConfig(**config)
-        assert (self.__create_connection(
-            ip=self.__config.ip_address, port=self.__config.port, timeout_s=self.__config.timeout_s))
-        assert (self.__login(env_path))
+        self.__config = CyclerInterfaceConfig.from_dict(config)
+        # Packed channel info requests by channel, as they are the same on every poll.
+        self.__channel_info_msgs = {}
+        # Lets threads share the interface without interleaving their messages on the socket.
+        self.__sock_lock = threading.Lock()
+        if not self.__create_connection(
+                ip=self.__config.ip_address, port=self.__config.port, timeout_s=self.__config.timeout_s):
+            raise ConnectionError(
+                f'Could not connect to Arbin server at {self.__config.ip_address}:{self.__config.port}!')
+        if not self.__login(env_path):
+            raise PermissionError('Could not log in to Arbin server!')
         self.__num_channels = self.get_login_feedback()['num_channels']
 
     def get_num_channels(self):
@@ -75,9 +109,12 @@ class CyclerInterface:
             return channel_info_msg_rx_dict
 
         try:
-            # Subtract one from the passed channel value to account for zero indexing
-            channel_info_msg_tx = Msg.ChannelInfo.Client.pack(
-                {'channel': (channel-1)})
+            channel_info_msg_tx = self.__channel_info_msgs.get(channel)
+            if channel_info_msg_tx is None:
+                # Subtract one from the passed channel value to account for zero indexing
+                channel_info_msg_tx = Msg.ChannelInfo.Client.pack(
+                    {'channel': (channel-1)})
+                self.__channel_info_msgs[channel] = channel_info_msg_tx
             response_msg_bin = self._send_receive_msg(
                 channel_info_msg_tx)
 
@@ -109,56 +146,94 @@ class CyclerInterface:
         rx_msg = b''
         send_msg_success = False
 
-        msg_length_format = MessageABC.base_template['msg_length']['format']
-        msg_length_start_byte_idx = MessageABC.base_template['msg_length']['start_byte']
-        msg_length_end_byte_idx = msg_length_start_byte_idx + \
-            struct.calcsize(msg_length_format)
-
-        if self.__sock:
-            try:
-                self.__sock.sendall(tx_msg)
-                send_msg_success = True
-            except socket.timeout:
-                logger.error(
-                    "Timeout on sending message from Arbin!", exc_info=True)
-                self.__reconnect()
-            except socket.error as e:
-                logger.error(
-                    "Failed to send message to Arbin!", exc_info=True)
-                logger.error(e)
-                self.__reconnect()
-
-            if send_msg_success:
+        # Only one request/response exchange can be in flight on the socket at a time.
+        with self.__sock_lock:
+            if self.__sock:
                 try:
-                    # Receive first part of message and determine length of entire message.
-                    rx_msg += self.__sock.recv(self.__config.msg_buffer_size)
-                    expected_rx_msg_len = struct.unpack(
-                        msg_length_format,
-                        rx_msg[msg_length_start_byte_idx:msg_length_end_byte_idx])[0]
-
-                    # Keep reading message in pieces until rx_msg is as long as expected_rx_msg_len.
-                    while len(rx_msg) < (expected_rx_msg_len):
-                        rx_msg += self.__sock.recv(
-                            self.__config.msg_buffer_size)
+                    self.__sock.sendall(tx_msg)
+                    send_msg_success = True
                 except socket.timeout:
                     logger.error(
-                        "Timeout on receiving message from Arbin!", exc_info=True)
+                        "Timeout on sending message from Arbin!", exc_info=True)
                     self.__reconnect()
                 except socket.error as e:
                     logger.error(
-                        "Error receiving message from Arbin!", exc_info=True)
+                        "Failed to send message to Arbin!", exc_info=True)
                     logger.error(e)
                     self.__reconnect()
-                except struct.error as e:
-                    logger.error(
-                        "Error unpacking message from Arbin!", exc_info=True)
-                    logger.error(e)
-        else:
-            logger.error(
-                "Cannot send message! Socket does not exist!")
+
+                if send_msg_success:
+                    try:
+                        rx_msg = self.__receive_msg()
+                    except socket.timeout:
+                        logger.error(
+                            "Timeout on receiving message from Arbin!", exc_info=True)
+                        self.__reconnect()
+                    except socket.error as e:
+                        logger.error(
+                            "Error receiving message from Arbin!", exc_info=True)
+                        logger.error(e)
+                        self.__reconnect()
+                    except struct.error as e:
+                        logger.error(
+                            "Error unpacking message from Arbin!", exc_info=True)
+                        logger.error(e)
+            else:
+                logger.error(
+                    "Cannot send message! Socket does not exist!")
 
         return rx_msg
 
+    def __receive_msg(self) -> bytearray:
+        """
+        Receives a single message from the Arbin server. The message length is read from the
+        first chunk received, and the rest of the message is read straight into a buffer sized
+        for it.
+
+        Returns
+        -------
+        rx_msg : bytearray
+            The received message.
+        """
+        # Bind the socket call and buffer size once for the receive loop below.
+        recv_into = self.__sock.recv_into
+        msg_buffer_size = self.__config.msg_buffer_size
+        rx_buf = bytearray(msg_buffer_size)
+        rx_view = memoryview(rx_buf)
+
+        # Receive first part of message and determine length of entire message.
+        rx_len = recv_into(rx_view, msg_buffer_size)
+        if not rx_len:
+            raise ConnectionResetError('Connection closed by Arbin server!')
+        expected_rx_msg_len = self.__msg_length_struct.unpack_from(
+            rx_view[:rx_len], self.__msg_length_start_byte)[0]
+        # Reject corrupt length headers before sizing or trimming the buffer with them.
+        # ConnectionError is a socket.error, so the caller logs it and reconnects.
+        if not MIN_SERVER_MSG_LENGTH <= expected_rx_msg_len <= MAX_MSG_LENGTH:
+            raise ConnectionError(
+                f'Invalid message length {expected_rx_msg_len} received from Arbin server!')
+
+        # Most responses arrive whole in the first chunk. Otherwise keep reading message in
+        # pieces until it is as long as expected_rx_msg_len. The buffer is grown by the
+        # expected length so every read still has room for a full chunk.
+        if rx_len < expected_rx_msg_len:
+            rx_view.release()
+            rx_buf.extend(bytes(expected_rx_msg_len))
+            rx_view = memoryview(rx_buf)
+            while rx_len < expected_rx_msg_len:
+                num_bytes = recv_into(rx_view[rx_len:], msg_buffer_size)
+                if not num_bytes:
+                    raise ConnectionResetError(
+                        'Connection closed by Arbin server!')
+                rx_len += num_bytes
+        rx_view.release()
+
+        # Arbin responses end at msg_length, which counts the checksum, so reading stops
+        # there. Extra bytes past it are only dropped if they arrived in the same reads; any
+        # that arrive later are left in the socket.
+        del rx_buf[min(rx_len, expected_rx_msg_len):]
+        return rx_buf
+
     def __create_connection(self, ip: str, port: int, timeout_s: float) -> bool:
         """
         Creates a TCP/IP connection with Arbin server.
@@ -180,6 +255,8 @@ class CyclerInterface:
         try:
             self.__sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.__sock.settimeout(timeout_s)
+            # Messages are small request/response pairs, so send them without Nagle delays.
+            self.__sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.__sock.connect((ip, port))
             logger.info("Connected to Arbin server!")
             success = True
@@ -199,44 +276,53 @@ class CyclerInterface:
         -------
         success : bool
             True/False based on whether the login was successful
+
+        Raises
+        ------
+        ConnectionError
+            If no login response was received from the Arbin server.
         """
         success = False
 
-        logger.info(f'Loading environment variables from {env_path}')
-        dotenv.load_dotenv(env_path, override=True)
+        # Credentials in the .env file take precedence over the environment variables.
+        username, password = _load_env_credentials(env_path)
+        username = username or os.getenv('ARBIN_CTI_USERNAME')
+        password = password or os.getenv('ARBIN_CTI_PASSWORD')
 
-        # Validate username and password are in the .env file.
-        if not os.getenv('ARBIN_CTI_USERNAME'):
+        # Validate username and password are in the .env file or environment variables.
+        if not username:
             raise ValueError(
                 'ARBIN_CTI_USERNAME not set in environment variables.')
-        if not os.getenv('ARBIN_CTI_PASSWORD'):
+        if not password:
             raise ValueError(
                 'ARBIN_CTI_PASSWORD not set in environment variables.')
 
         login_msg_tx = Msg.Login.Client.pack(
-            msg_values={'username': os.getenv('ARBIN_CTI_USERNAME'), 'password': os.getenv('ARBIN_CTI_PASSWORD')})
+            msg_values={'username': username, 'password': password})
 
         response_msg_bin = self._send_receive_msg(login_msg_tx)
+        # A missing response is a network failure, not a rejected login.
+        if not response_msg_bin:
+            raise ConnectionError('No login response received from Arbin server!')
 
-        if response_msg_bin:
-            login_msg_rx_dict = Msg.Login.Server.unpack(response_msg_bin)
-            if login_msg_rx_dict['result'] == 'success':
-                success = True
-                logger.info(
-                    "Successfully logged in to cycler " + str(login_msg_rx_dict['cycler_sn']))
-                logger.info(login_msg_rx_dict)
-            elif login_msg_rx_dict['result'] == "already logged in":
-                success = True
-                logger.warning(
-                    "Already logged in to cycler " + str(login_msg_rx_dict['cycler_sn']))
-            elif login_msg_rx_dict['result'] == 'fail':
-                logger.error(
-                    "Login failed with provided credentials!")
-            else:
-                logger.error(
-                    f'Unknown login result {login_msg_rx_dict["result"]}')
+        login_msg_rx_dict = Msg.Login.Server.unpack(response_msg_bin)
+        if login_msg_rx_dict['result'] == 'success':
+            success = True
+            logger.info(
+                "Successfully logged in to cycler " + str(login_msg_rx_dict['cycler_sn']))
+            logger.info(login_msg_rx_dict)
+        elif login_msg_rx_dict['result'] == "already logged in":
+            success = True
+            logger.warning(
+                "Already logged in to cycler " + str(login_msg_rx_dict['cycler_sn']))
+        elif login_msg_rx_dict['result'] == 'fail':
+            logger.error(
+                "Login failed with provided credentials!")
+        else:
+            logger.error(
+                f'Unknown login result {login_msg_rx_dict["result"]}')
 
-            self.__login_feedback = login_msg_rx_dict
+        self.__login_feedback = login_msg_rx_dict
 
         return success
 
@@ -250,7 +336,23 @@ class CyclerInterface:
             ip=self.__config.ip_address, port=self.__config.port, timeout_s=self.__config.timeout_s)
 
 
-class CyclerInterfaceConfig(BaseModel):
+class _ConfigFromDict:
+    '''
+    Mixin that lets the interface config dataclasses be built from configuration dictionaries.
+    '''
+
+    @classmethod
+    def from_dict(cls, config: dict):
+        '''
+        Creates the config from a configuration dictionary, ignoring any keys that are not
+        config fields.
+        '''
+        field_names = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in config.items() if key in field_names})
+
+
+@dataclass
+class CyclerInterfaceConfig(_ConfigFromDict):
     '''
     Holds channel config information for the CyclerInterface class.
 
@@ -270,3 +372,8 @@ class CyclerInterfaceConfig(BaseModel):
     port: int
     timeout_s: float = 3.0
     msg_buffer_size: int = 4096
+
+    def __post_init__(self):
+        self.port = int(self.port)
+        self.timeout_s = float(self.timeout_s)
+        self.msg_buffer_size = int(self.msg_buffer_size)
@@ -1,11 +1,48 @@
 import struct
 import logging
-import re
-from copy import deepcopy
+from collections import namedtuple
 from abc import ABC
 
 logger = logging.getLogger(__name__)
 
+# Every message is terminated by a checksum of all preceding bytes
+CHECKSUM_STRUCT = struct.Struct('<H')
+
+# Layout of a single message field, compiled once per class from the message templates.
+# text_encoding is None for numeric fields, so pack/unpack can tell them apart without
+# re-inspecting the format.
+MessageField = namedtuple(
+    'MessageField', ['name', 'struct', 'start_byte', 'text_encoding'])
+
+
+def _byte_sum(data) -> int:
+    '''
+    Sums the bytes in the passed buffer. Messages are mostly 0x00 padding, which adds
+    nothing to the sum, so the zeros are stripped in C before the Python level sum.
+    '''
+    return sum(data.translate(None, b'\x00'))
+
+
+def _code_table(code_dict: dict) -> tuple:
+    '''
+    Converts a dict of small non-negative int codes into a tuple indexed by code, so
+    decoding is a tuple index rather than a hash lookup. Gaps are filled with None.
+    '''
+    return tuple(code_dict.get(code) for code in range(max(code_dict) + 1))
+
+
+def _decode_code(code_table: tuple, code: int, msg_name: str, field_name: str) -> str:
+    '''
+    Looks up code in a table built by _code_table. Codes missing from the table are
+    logged against the message and field they came from and decoded as 'Unknown'.
+    '''
+    decoded = code_table[code] if 0 <= code < len(code_table) else None
+    if decoded is None:
+        logger.warning(
+            f'Unknown {field_name} code {code} for {msg_name} message!')
+        return 'Unknown'
+    return decoded
+
 
 class MessageABC(ABC):
 
@@ -42,6 +79,87 @@ class MessageABC(ABC):
         },
     }
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        template = {**cls.base_template, **cls.msg_specific_template}
+
+        # Flatten the template dictionaries into field tuples for the pack/unpack loops,
+        # ordered by where each field sits in the message.
+        cls._fields = tuple(sorted(
+            (MessageField(
+                name=name,
+                struct=struct.Struct(item['format']),
+                start_byte=item['start_byte'],
+                text_encoding=(item.get('text_encoding')
+                               if item['format'].endswith(('s', 'c')) else None))
+             for name, item in template.items()),
+            key=lambda field: field.start_byte))
+        cls._fields_by_name = {field.name: field for field in cls._fields}
+
+        # Check the layout once here instead of trusting it on every pack/unpack
+        for prev_field, field in zip(cls._fields, cls._fields[1:]):
+            if prev_field.start_byte + prev_field.struct.size > field.start_byte:
+                raise ValueError(
+                    f'Field {field.name} overlaps field {prev_field.name} in {cls.__qualname__}!')
+
+        # One Struct spanning every field, with pad bytes over the gaps between them, so
+        # unpack() reads the whole message in a single call. Fields are little-endian on
+        # the wire, including the few templates that omit the byte order.
+        layout = []
+        end_byte = 0
+        for field in cls._fields:
+            if field.start_byte > end_byte:
+                layout.append(f'{field.start_byte - end_byte}x')
+            layout.append(field.struct.format.lstrip('@=<>!'))
+            end_byte = field.start_byte + field.struct.size
+        cls._msg_struct = struct.Struct('<' + ''.join(layout))
+        cls._field_names = tuple(field.name for field in cls._fields)
+
+        # String fields to decode after unpacking, with the decode error handling and code
+        # unit size for each. Undecodable utf-8 characters are ignored.
+        cls._text_fields = tuple(
+            (field.name, field.text_encoding,
+             'ignore' if field.text_encoding == 'utf-8' else 'strict',
+             2 if field.text_encoding.startswith('utf-16') else 1)
+            for field in cls._fields if field.struct.format.endswith('s'))
+
+        # Number of bytes the packed message occupies before the checksum. Some fields
+        # extend past `msg_length`, so size the buffer to fit the furthest field.
+        cls._body_length = max(
+            [cls.msg_length] + [field.start_byte + field.struct.size for field in cls._fields])
+
+        # Pack the default values once, leaving the checksum zeroed. The message length and
+        # command code are class constants, so they are baked in here. pack() starts from a
+        # copy of this message and only writes the fields that are overridden.
+        default_values = {name: item['value'] for name, item in template.items()}
+        default_values['msg_length'] = cls.msg_length
+        default_values['command_code'] = cls.command_code
+        default_msg = bytearray(cls._body_length + CHECKSUM_STRUCT.size)
+        for field in cls._fields:
+            cls._pack_field(default_msg, field, default_values[field.name])
+        cls._default_msg = bytes(default_msg)
+
+    @staticmethod
+    def _pack_field(msg_bin: bytearray, field: MessageField, value):
+        """
+        Packs a single value into the passed message at the position of the field.
+
+        Parameters
+        ----------
+        msg_bin : bytearray
+            The message to pack the value into.
+        field : MessageField
+            The field to pack.
+        value
+            The value to pack. String fields accept `str` or already encoded `bytes`.
+        """
+        # String values may be passed already encoded to avoid re-encoding them
+        if field.text_encoding is not None and isinstance(value, str):
+            value = value.encode(field.text_encoding)
+        # Write straight into the message rather than packing to a temporary first
+        field.struct.pack_into(msg_bin, field.start_byte, value)
+
     @classmethod
     def unpack(cls, msg_bin: bytearray) -> dict:
         """
@@ -59,27 +177,17 @@ class MessageABC(ABC):
         decoded_msg_dict : dict
             The message items decoded into a dictionary.
         """
-        decoded_msg_dict = {}
-
-        # Create a template to unpack message with
-        template = {**deepcopy(cls.base_template),
-                   **deepcopy(cls.msg_specific_template)}
-
-        for item_name, item in template.items():
-            start_idx = item['start_byte']
-            end_idx = item['start_byte'] + struct.calcsize(item['format'])
-            decoded_msg_dict[item_name] = struct.unpack(
-                item['format'], msg_bin[start_idx:end_idx])[0]
-
-            # Decode and strip trailing 0x00s from strings.
-            if item['format'].endswith('s'):
-                # ignore utf-8 characters that cannot be decoded
-                if item['text_encoding'] == 'utf-8':
-                    decoded_msg_dict[item_name] = decoded_msg_dict[item_name].decode(
-                        item['text_encoding'], errors='ignore').rstrip('\x00')
-                else:
-                    decoded_msg_dict[item_name] = decoded_msg_dict[item_name].decode(
-                        item['text_encoding']).rstrip('\x00')
+        decoded_msg_dict = dict(
+            zip(cls._field_names, cls._msg_struct.unpack_from(msg_bin)))
+
+        # Decode and strip trailing 0x00s from strings. String fields are mostly 0x00 padding,
+        # so strip the padding bytes before decoding, keeping whole code units for utf-16.
+        for name, text_encoding, errors, code_unit_size in cls._text_fields:
+            value = decoded_msg_dict[name].rstrip(b'\x00')
+            if len(value) % code_unit_size:
+                value += b'\x00'
+            decoded_msg_dict[name] = value.decode(
+                text_encoding, errors).rstrip('\x00')
 
         if decoded_msg_dict['command_code'] != cls.command_code:
             logger.warning(
@@ -91,6 +199,33 @@ class MessageABC(ABC):
 
         return decoded_msg_dict
 
+    @classmethod
+    def verify_checksum(cls, msg_bin: bytearray) -> bool:
+        """
+        Checks that the checksum at the end of the passed message matches the
+        sum of all the bytes that precede it.
+
+        Parameters
+        ----------
+        msg_bin : bytearray
+            The message to check, including the trailing checksum.
+
+        Returns
+        -------
+        valid : bool
+            True if the checksum matches, False otherwise.
+        """
+        checksum_size = CHECKSUM_STRUCT.size
+        if len(msg_bin) < checksum_size:
+            return False
+
+        msg_view = memoryview(msg_bin)
+        received_checksum = int.from_bytes(msg_view[-checksum_size:], 'little')
+        # Sum the whole message and back out the checksum bytes rather than slicing off a copy
+        computed_checksum = _byte_sum(msg_bin) - sum(msg_view[-checksum_size:])
+
+        return (computed_checksum & 0xFFFF) == received_checksum
+
     @classmethod
     def pack(cls, msg_values={}) -> bytearray:
         """
@@ -102,57 +237,43 @@ class MessageABC(ABC):
         ----------
         msg_values : dict
             A dictionary detailing which default values in the message temple should be 
-            updated.
+            updated. Values for string fields can be given as `str` or as `bytes` that are 
+            already encoded with the field's `text_encoding`.
 
         Returns
         -------
         msg_bin : bytearray
             Packed response message.
         """
-        # Create a template to build messages from
-        template = {**deepcopy(cls.base_template),
-                   **deepcopy(cls.msg_specific_template)}
-
-        # Update the template with message specific length and command code
-        template['msg_length']['value'] = cls.msg_length
-        template['command_code']['value'] = cls.command_code
-
-        # Create a message bytearray that will be loaded with message contents
-        msg_bin = bytearray(template['msg_length']['value'])
+        # Start from the packed default message, which already has space for the checksum,
+        # and only pack the fields that are being changed.
+        msg_bin = bytearray(cls._default_msg)
 
         # Update default message values with those in the passed msg_values dict
-        for key in msg_values.keys():
-            if key in template.keys():
-                template[key]['value'] = msg_values[key]
-            else:
-                logger.warning(
-                    f'Key name {key} was not found in msg_encoding!')
-
-        # Pack each item in template. If packing any item fails then abort packing.
-        for item_name, item in template.items():
-            logger.debug(f'Packing item {item_name}')
+        unknown_keys = msg_values.keys() - cls._fields_by_name.keys()
+        if unknown_keys:
+            logger.warning(
+                f'Key names {sorted(unknown_keys)} were not found in msg_encoding!')
+
+        # If packing any field fails then abort packing.
+        for field_name, value in msg_values.items():
+            field = cls._fields_by_name.get(field_name)
+            if field is None:
+                continue
+            logger.debug('Packing item %s', field_name)
             try:
-                if item['format'].endswith('s') or item['format'].endswith('c'):
-                    packed_item = struct.pack(
-                        item['format'],
-                        item['value'].encode(item['text_encoding']))
-                else:
-                    packed_item = struct.pack(
-                        item['format'], item['value'])
+                cls._pack_field(msg_bin, field, value)
             except struct.error as e:
                 logger.error(
-                    f'Error packing {item_name} with fields {item}!')
+                    f'Error packing {field_name} with value {value} and fields {field}!')
                 logger.error(e)
                 msg_bin = bytearray([])
                 break
 
-            start_idx = item['start_byte']
-            end_idx = item['start_byte'] + struct.calcsize(item['format'])
-            msg_bin[start_idx:end_idx] = packed_item
-
-        # Append a checksum to the end of the message
+        # Write the checksum into the end of the message. The checksum slot is still zeroed
+        # so it does not contribute to the sum.
         if msg_bin:
-            msg_bin += struct.pack('<H', sum(msg_bin))
+            CHECKSUM_STRUCT.pack_into(msg_bin, cls._body_length, _byte_sum(msg_bin) & 0xFFFF)
 
         return msg_bin
 
@@ -288,12 +409,13 @@ class Msg:
                 2: "fail",
                 3: "already logged in"
             }
+            login_result_table = _code_table(login_result_dict)
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
                 """
                 Same as the parent method, but converts the result based on the
-                login_result_dict.
+                login_result_dict. Unknown result codes are decoded as 'Unknown'.
 
                 Parameters
                 ----------
@@ -306,7 +428,9 @@ class Msg:
                     The message with items decoded into a dictionary
                 """
                 msg_dict = super().unpack(msg_bin)
-                msg_dict['result'] = cls.login_result_dict[msg_dict['result']]
+                msg_dict['result'] = _decode_code(
+                    cls.login_result_table, msg_dict['result'],
+                    cls.__qualname__, 'result')
                 return msg_dict
 
     class ChannelInfo:
@@ -338,7 +462,7 @@ class Msg:
                 'reserved': {
                     'format': '32s',
                     'start_byte': 28,
-                    'value': ''.join(['\0' for i in range(32)]),
+                    'value': '\0' * 32,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -598,6 +722,28 @@ class Msg:
                 29: 'DAQ Memory Unsafe',
                 30: 'ACR'
             }
+            status_code_table = _code_table(status_code_dict)
+
+            # (count name, reading name, dt name) for each aux type, in the order
+            # the aux types are laid out in the message.
+            aux_field_names = tuple(
+                (aux_count_name, aux_count_name[:-len('_count')],
+                 aux_count_name[:-len('_count')] + '_dt')
+                for aux_count_name in (
+                    'aux_voltage_count',
+                    'aux_temperature_count',
+                    'aux_pressure_count',
+                    'aux_external_count',
+                    'aux_flow_count',
+                    'aux_ao_count',
+                    'aux_di_count',
+                    'aux_do_count',
+                    'aux_humidity_count',
+                    'aux_safety_count',
+                    'aux_ph_count',
+                    'aux_density_count'
+                )
+            )
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
@@ -617,7 +763,9 @@ class Msg:
                 msg_dict = super().unpack(msg_bin)
                 msg_dict = cls.aux_readings_parser(
                     msg_dict, msg_bin, starting_aux_idx=1777)
-                msg_dict['status'] = cls.status_code_dict[msg_dict['status']]
+                msg_dict['status'] = _decode_code(
+                    cls.status_code_table, msg_dict['status'],
+                    cls.__qualname__, 'status')
                 return msg_dict
 
             @classmethod
@@ -660,51 +808,23 @@ class Msg:
                 msg_dict : dict
                     The message with items decoded into a dictionary
                 """
-                aux_lists = []
-
-                aux_count_name_list = [
-                    'aux_voltage_count',
-                    'aux_temperature_count',
-                    'aux_pressure_count',
-                    'aux_external_count',
-                    'aux_flow_count',
-                    'aux_ao_count',
-                    'aux_di_count',
-                    'aux_do_count',
-                    'aux_humidity_count',
-                    'aux_safety_count',
-                    'aux_ph_count',
-                    'aux_density_count'
-                ]
-
-                # Generate a list of readings for each aux reading.
-                # If count is non-zero then genreate a aux_reading and aux_reading_dt list of that length
-                # Else, generate empty lists for the aux_reading and aux_reading_dt
-                for aux_count_name in aux_count_name_list:
-                    aux_reading_name = re.split('_count', aux_count_name)[0]
-                    aux_dt_name = aux_reading_name + '_dt'
-                    if msg_dict[aux_count_name]:
-                        msg_dict[aux_reading_name] = [0 for x in range(
-                            msg_dict[aux_count_name])]
-                        msg_dict[aux_dt_name] = [0 for x in range(
-                            msg_dict[aux_count_name])]
-                        aux_lists.append(
-                            [msg_dict[aux_reading_name], msg_dict[aux_dt_name]])
-                    else:
-                        msg_dict[aux_reading_name] = []
-                        msg_dict[aux_dt_name] = []
-
-                # For aux readings that have a measurements, add them to the respective reading list.
-                current_aux_idx = starting_aux_idx
-                for readings_list in aux_lists:
-                    for i in range(0, len(readings_list[0])):
-                        # The first list in reading list is reading itself
-                        readings_list[0][i] = struct.unpack(
-                            '<f', msg_bin[current_aux_idx:current_aux_idx+4])[0]
-                        # The second reading in the list is the dt value.
-                        readings_list[1][i] = struct.unpack(
-                            '<f', msg_bin[current_aux_idx+4:current_aux_idx+8])[0]
-                        current_aux_idx += 8
+                # Each aux reading is stored as a reading/dt pair of floats, one after another.
+                # Unpack the whole aux block in a single call.
+                total_aux_count = sum(msg_dict[aux_count_name]
+                                      for aux_count_name, _, _ in cls.aux_field_names)
+                aux_values = struct.unpack_from(
+                    f'<{2 * total_aux_count}f', msg_bin, starting_aux_idx)
+
+                # Split the block into a reading list and a dt list for each aux type.
+                # Aux types with a count of zero get empty lists.
+                current_aux_idx = 0
+                for aux_count_name, aux_reading_name, aux_dt_name in cls.aux_field_names:
+                    next_aux_idx = current_aux_idx + 2 * msg_dict[aux_count_name]
+                    msg_dict[aux_reading_name] = list(
+                        aux_values[current_aux_idx:next_aux_idx:2])
+                    msg_dict[aux_dt_name] = list(
+                        aux_values[current_aux_idx + 1:next_aux_idx:2])
+                    current_aux_idx = next_aux_idx
 
                 return msg_dict
 
@@ -832,7 +952,7 @@ class Msg:
                 'reserved': {
                     'format': '32s',
                     'start_byte': 637,
-                    'value': ''.join(['\0' for i in range(32)]),
+                    'value': '\0' * 32,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -856,7 +976,7 @@ class Msg:
                 'reserved': {
                     'format': '101s',
                     'start_byte': 25,
-                    'value': ''.join(['\0' for i in range(101)]),
+                    'value': '\0' * 101,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -873,12 +993,13 @@ class Msg:
                 23: 'Assign failed',
                 24: 'Not used: User should never see this',
             }
+            result_table = _code_table(assign_schedule_feedback_codes)
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
                 """
                 Same as the parent method, but converts the result based on the
-                assign_schedule_feedback_codes.
+                assign_schedule_feedback_codes. Unknown result codes are decoded as 'Unknown'.
 
                 Parameters
                 ----------
@@ -891,8 +1012,9 @@ class Msg:
                     The message with items decoded into a dictionary
                 """
                 msg_dict = super().unpack(msg_bin)
-                msg_dict['result'] = cls.assign_schedule_feedback_codes[
-                    ord(msg_dict['result'])]
+                msg_dict['result'] = _decode_code(
+                    cls.result_table, msg_dict['result'][0],
+                    cls.__qualname__, 'result')
                 return msg_dict
 
     class StartSchedule:
@@ -944,7 +1066,7 @@ class Msg:
                 'reserved': {
                     'format': '101s',
                     'start_byte': 25,
-                    'value': ''.join(['\0' for i in range(101)]),
+                    'value': '\0' * 101,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -977,12 +1099,13 @@ class Msg:
                 39: 'Not used: User should never see this',
                 40: 'Battery simulation error',
             }
+            result_table = _code_table(start_test_feedback_codes)
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
                 """
                 Same as the parent method, but converts the result based on the
-                start_test_feedback_codes.
+                start_test_feedback_codes. Unknown result codes are decoded as 'Unknown'.
 
                 Parameters
                 ----------
@@ -995,8 +1118,9 @@ class Msg:
                     The message with items decoded into a dictionary
                 """
                 msg_dict = super().unpack(msg_bin)
-                msg_dict['result'] = cls.start_test_feedback_codes[
-                    ord(msg_dict['result'])]
+                msg_dict['result'] = _decode_code(
+                    cls.result_table, msg_dict['result'][0],
+                    cls.__qualname__, 'result')
                 return msg_dict
 
     class StopSchedule:
@@ -1025,7 +1149,7 @@ class Msg:
                 'reserved': {
                     'format': '101s',
                     'start_byte': 25,
-                    'value': ''.join(['\0' for i in range(101)]),
+                    'value': '\0' * 101,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -1049,7 +1173,7 @@ class Msg:
                 'reserved': {
                     'format': '101s',
                     'start_byte': 25,
-                    'value': ''.join(['\0' for i in range(101)]),
+                    'value': '\0' * 101,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -1061,12 +1185,13 @@ class Msg:
                 18: 'Not used: User should never see this',
                 19: 'Not used: User should never see this',
             }
+            result_table = _code_table(stop_test_feedback_codes)
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
                 """
                 Same as the parent method, but converts the result based on the
-                stop_test_feedback_codes.
+                stop_test_feedback_codes. Unknown result codes are decoded as 'Unknown'.
 
                 Parameters
                 ----------
@@ -1079,8 +1204,9 @@ class Msg:
                     The message with items decoded into a dictionary
                 """
                 msg_dict = super().unpack(msg_bin)
-                msg_dict['result'] = cls.stop_test_feedback_codes[
-                    ord(msg_dict['result'])]
+                msg_dict['result'] = _decode_code(
+                    cls.result_table, msg_dict['result'][0],
+                    cls.__qualname__, 'result')
                 return msg_dict
 
     class SetMetaVariable:
@@ -1114,7 +1240,7 @@ class Msg:
                 'reserved_1': {
                     'format': '16s',
                     'start_byte': 32,
-                    'value': ''.join(['\0' for i in range(16)]),
+                    'value': '\0' * 16,
                     'text_encoding': 'utf-8',
                 },
                 # The only value type allowed for CTI is 1, float.
@@ -1131,7 +1257,7 @@ class Msg:
                 'reserved_2': {
                     'format': '16s',
                     'start_byte': 56,
-                    'value': ''.join(['\0' for i in range(16)]),
+                    'value': '\0' * 16,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -1175,7 +1301,7 @@ class Msg:
                 'reserved': {
                     'format': '101s',
                     'start_byte': 25,
-                    'value': ''.join(['\0' for i in range(101)]),
+                    'value': '\0' * 101,
                     'text_encoding': 'utf-8',
                 },
             }
@@ -1186,12 +1312,13 @@ class Msg:
                 17: 'Channel is not running',
                 18: 'Meta code does not exist'
             }
+            result_table = _code_table(mv_result_decoder)
 
             @classmethod
             def unpack(cls, msg_bin: bytearray) -> dict:
                 """
                 Same as the parent method, but converts the result based on the
-                stop_test_feedback_codes.
+                mv_result_decoder. Unknown result codes are decoded as 'Unknown'.
 
                 Parameters
                 ----------
@@ -1206,12 +1333,26 @@ class Msg:
                 msg_dict = super().unpack(msg_bin)
 
                 # Convert the result code to a string
-                result = ord(msg_dict['result'])
-                if result not in cls.mv_result_decoder.keys():
-                    logger.warning(
-                        f'Unknown result code {result} for SetMetaVariable message!')
-                    msg_dict['result'] = 'Unknown'
-                else:
-                    msg_dict['result'] = cls.mv_result_decoder[result]
+                msg_dict['result'] = _decode_code(
+                    cls.result_table, msg_dict['result'][0],
+                    cls.__qualname__, 'result')
 
                 return msg_dict
+
+
+# Upper bound on the msg_length a peer can legitimately send: the longest message layout, or
+# a channel info message with every (uint16) aux count at its maximum, each aux reading being
+# a reading/dt pair of floats. Used to reject corrupt length headers before buffering them.
+MAX_MSG_LENGTH = max(
+    [msg_cls._body_length
+     for msg_group in vars(Msg).values() if isinstance(msg_group, type)
+     for msg_cls in (msg_group.Client, msg_group.Server)]
+    + [Msg.ChannelInfo.Server._body_length
+       + len(Msg.ChannelInfo.Server.aux_field_names) * 0xFFFF * 2 * struct.calcsize('<f')]
+) + CHECKSUM_STRUCT.size
+
+# Lower bound on the msg_length of a response from the Arbin server: the shortest server
+# message layout. Shorter lengths cannot be unpacked, so they are rejected as corrupt.
+MIN_SERVER_MSG_LENGTH = min(
+    msg_group.Server._msg_struct.size
+    for msg_group in vars(Msg).values() if isinstance(msg_group, type))
@@ -2,7 +2,8 @@ import os
 import socket
 import json
 import struct
-from pyctiarbin import MessageABC
+import threading
+from pyctiarbin import MessageABC, Msg
 
 
 class Constants:
@@ -50,27 +51,121 @@ class TcpClient():
         rx_msg : dict
             The response msg.
         """
-        rx_msg_length_format = MessageABC.base_template['msg_length']['format']
+        rx_msg_length_struct = struct.Struct(
+            MessageABC.base_template['msg_length']['format'])
         rx_msg_length_start_byte = MessageABC.base_template['msg_length']['start_byte']
-        rx_msg_length_end_byte = MessageABC.base_template['msg_length']['start_byte'] + struct.calcsize(
-            rx_msg_length_format)
 
         self.__s.sendall(tx_msg)
 
-        rx_msg = b''
-        rx_msg += self.__s.recv(self.msg_buffer_size)
-        expected_rx_msg_len = struct.unpack(
-            rx_msg_length_format, rx_msg[rx_msg_length_start_byte:rx_msg_length_end_byte])[0]
-        # Keep reading message in pieces until rx_msg is as long as expected_rx_msg_len
-        while len(rx_msg) < expected_rx_msg_len:
-            rx_msg += self.__s.recv(self.msg_buffer_size)
-
+        rx_msg = self.__s.recv(self.msg_buffer_size)
+        expected_rx_msg_len = rx_msg_length_struct.unpack_from(
+            rx_msg, rx_msg_length_start_byte)[0]
+        if len(rx_msg) >= expected_rx_msg_len:
+            return rx_msg
+
+        # Keep reading message in pieces into a preallocated buffer until it is as long as
+        # expected_rx_msg_len, leaving room for a full chunk past it.
+        rx_buf = bytearray(expected_rx_msg_len + self.msg_buffer_size)
+        rx_len = len(rx_msg)
+        rx_buf[:rx_len] = rx_msg
+        rx_view = memoryview(rx_buf)
+        while rx_len < expected_rx_msg_len:
+            num_bytes = self.__s.recv_into(rx_view[rx_len:], self.msg_buffer_size)
+            if not num_bytes:
+                break
+            rx_len += num_bytes
+        rx_view.release()
+
+        del rx_buf[rx_len:]
+        rx_msg = rx_buf
         return rx_msg
 
+    def send_recv_raw(self, tx_msg) -> bytes:
+        """
+        Sends the passed message and returns whatever a single receive gets back, without
+        assembling a whole response. Returns b'' if the server closed or reset the connection.
+
+        Parameters
+        ----------
+        tx_msg : bytearray
+            The message to send.
+
+        Returns
+        -------
+        rx_msg : bytes
+            The bytes received.
+        """
+        self.__s.sendall(tx_msg)
+        try:
+            return self.__s.recv(self.msg_buffer_size)
+        except ConnectionResetError:
+            return b''
+
     def __delete__(self):
         self.__s.close()
 
 
+
+class ScriptedArbinServer():
+    """
+    Bare bones Arbin server for checking how the interfaces handle particular server
+    responses. Login requests are answered with a login response carrying `login_result`,
+    or not at all if it is None, and every other request with the next message in `responses`. Connections are served
+    one at a time, so a client that reconnects is picked up once it closes the old socket,
+    and counted in `num_connections`.
+    """
+
+    def __init__(self, config, responses=(), login_result=1, num_channels=16):
+        self.__login_response = None if login_result is None else Msg.Login.Server.pack(
+            {'result': login_result, 'num_channels': num_channels})
+        self.__responses = list(responses)
+        self.__stop = threading.Event()
+        self.num_connections = 0
+
+        self.__s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__s.bind((config["ip"], config["port"]))
+        self.__s.settimeout(0.1)
+        self.__s.listen()
+
+        self.__thread = threading.Thread(target=self.__serve, daemon=True)
+        self.__thread.start()
+
+    def __serve(self):
+        cmd_code_struct = struct.Struct(
+            MessageABC.base_template['command_code']['format'])
+        cmd_code_start_byte = MessageABC.base_template['command_code']['start_byte']
+
+        while not self.__stop.is_set():
+            try:
+                conn = self.__s.accept()[0]
+            except socket.timeout:
+                continue
+            self.num_connections += 1
+
+            with conn:
+                conn.settimeout(0.1)
+                while not self.__stop.is_set():
+                    try:
+                        rx_msg = conn.recv(4096)
+                    except socket.timeout:
+                        continue
+                    if not rx_msg:
+                        break
+
+                    if cmd_code_struct.unpack_from(rx_msg, cmd_code_start_byte)[0] == \
+                            Msg.Login.Client.command_code:
+                        if self.__login_response is not None:
+                            conn.sendall(self.__login_response)
+                    elif self.__responses:
+                        conn.sendall(self.__responses.pop(0))
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.__s.close()
+
+
 def message_file_loader(msg_dir, msg_file_name: str) -> tuple:
     '''
     Helper function to read in example messages from files.
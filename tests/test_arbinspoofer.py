@@ -1,7 +1,9 @@
 import pytest
+import struct
 from helper_test_utils import Constants, TcpClient
 from pyctiarbin.arbinspoofer import ArbinSpoofer
-from pyctiarbin.messages import Msg
+from pyctiarbin.arbinspoofer.arbin_spoofer import ChannelData
+from pyctiarbin.messages import Msg, MessageABC, MAX_MSG_LENGTH
 
 """
 Various parameters we will use across all the tests.
@@ -81,3 +83,66 @@ def test_update_status():
             < Constants.FLOAT_TOLERANCE)
 
     arbin_spoofer.stop()
+
+
+@pytest.mark.arbinspoofer
+def test_channel_data_instances_independent():
+    """
+    Check that separate ChannelData instances do not share channel readings.
+    """
+    channel_data_1 = ChannelData(2)
+    channel_data_2 = ChannelData(4)
+
+    channel_data_1.update_channel_readings(1, {'voltage_v': 3.3})
+
+    assert (channel_data_1.fetch_channel_readings(1)['voltage_v'] == 3.3)
+    assert (channel_data_2.fetch_channel_readings(1)['voltage_v'] == 0)
+    assert (channel_data_2.fetch_channel_readings(3)['channel'] == 3)
+
+
+@pytest.mark.arbinspoofer
+def test_channel_data_update_validation():
+    """
+    Check that updates with unknown reading names are rejected without changing the readings.
+    """
+    channel_data = ChannelData(2)
+
+    assert (channel_data.update_channel_readings(0, {'voltage_v': 1.5}) is True)
+    assert (channel_data.update_channel_readings(
+        0, {'voltage_v': 2.5, 'bogus': 1}) is False)
+    assert (channel_data.fetch_channel_readings(0)['voltage_v'] == 1.5)
+
+
+@pytest.mark.arbinspoofer
+def test_channel_data_out_of_range():
+    """
+    Check that channels outside 0..num_channels-1 are rejected rather than raising.
+    """
+    channel_data = ChannelData(2)
+
+    assert (channel_data.fetch_channel_readings(2) == {})
+    assert (channel_data.fetch_channel_readings(-1) == {})
+    assert (channel_data.update_channel_readings(2, {'voltage_v': 1.0}) is False)
+
+
+@pytest.mark.arbinspoofer
+def test_invalid_msg_length():
+    """
+    Check that the spoofer drops a client that sends an oversized message length.
+    """
+    CONFIG_DICT['port'] = 5680
+    arbin_spoofer = ArbinSpoofer(CONFIG_DICT)
+    arbin_spoofer.start()
+
+    client = TcpClient(CONFIG_DICT)
+
+    # Claim a message far longer than any the protocol allows.
+    tx_msg = Msg.ChannelInfo.Client.pack()
+    struct.pack_into(MessageABC.base_template['msg_length']['format'], tx_msg,
+                     MessageABC.base_template['msg_length']['start_byte'], MAX_MSG_LENGTH + 1)
+
+    # The spoofer should close the connection rather than wait for the rest of the message.
+    # If it waited instead, the client's receive would time out.
+    assert (client.send_recv_raw(tx_msg) == b'')
+
+    arbin_spoofer.stop()
@@ -132,3 +132,17 @@ def test_channel_info_server_msg():
     packed_msg = Msg.ChannelInfo.Server.pack(buildable_msg_dict)
     parsed_msg = Msg.ChannelInfo.Server.unpack(packed_msg)
     assert (parsed_msg == msg_dict)
+
+
+@pytest.mark.messages
+def test_channel_info_server_unknown_status():
+    '''
+    Test that a status code outside the status table is decoded as Unknown
+    '''
+    packed_msg = Msg.ChannelInfo.Server.pack({'status': 99})
+    parsed_msg = Msg.ChannelInfo.Server.unpack(packed_msg)
+    assert (parsed_msg['status'] == 'Unknown')
+
+    packed_msg = Msg.ChannelInfo.Server.pack({'status': -1})
+    parsed_msg = Msg.ChannelInfo.Server.unpack(packed_msg)
+    assert (parsed_msg['status'] == 'Unknown')
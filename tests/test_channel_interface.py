@@ -1,5 +1,6 @@
 import pytest
 from pyctiarbin import ChannelInterface
+from pyctiarbin.channel_interface import ChannelInterfaceConfig
 from pyctiarbin.arbinspoofer import ArbinSpoofer
 from pyctiarbin.messages import Msg
 
@@ -69,4 +70,17 @@ def test_set_meta_variable():
     Test that assigning schedule  works correctly.
     """
     arbin_interface = ChannelInterface(CHANNEL_INTERFACE_CONFIG)
-    assert(arbin_interface.set_meta_variable(mv_num=1, mv_value=4.20))
\ No newline at end of file
+    assert(arbin_interface.set_meta_variable(mv_num=1, mv_value=4.20))
+
+@pytest.mark.channel_interface
+def test_channel_interface_config():
+    """
+    Test that the config zero indexes the channel, ignores extra keys and rejects bad channels.
+    """
+    config = ChannelInterfaceConfig.from_dict(
+        {**CHANNEL_INTERFACE_CONFIG, 'extra_key': 'ignored'})
+    assert (config.channel == ARBIN_CHANNEL)
+    assert (config.timeout_s == 3.0)
+
+    with pytest.raises(ValueError):
+        ChannelInterfaceConfig.from_dict({**CHANNEL_INTERFACE_CONFIG, 'channel': 0})
@@ -1,7 +1,11 @@
 import pytest
+import os
+import struct
 from pyctiarbin import CyclerInterface
+from pyctiarbin.cycler_interface import _load_env_credentials
 from pyctiarbin.arbinspoofer import ArbinSpoofer
-from pyctiarbin.messages import Msg
+from pyctiarbin.messages import Msg, MessageABC, MAX_MSG_LENGTH
+from helper_test_utils import ScriptedArbinServer
 
 ARBIN_CHANNEL = 1
 
@@ -39,4 +43,117 @@ def test_read_channel_status():
 
     channel_status_bin_key = Msg.ChannelInfo.Server.pack({'channel': 1})
     channel_status_key = Msg.ChannelInfo.Server.unpack(channel_status_bin_key)
-    assert(channel_status == channel_status_key)
\ No newline at end of file
+    assert(channel_status == channel_status_key)
+
+@pytest.mark.cycler_interface
+def test_connection_failure():
+    """
+    Test that failing to connect raises a ConnectionError.
+    """
+    with pytest.raises(ConnectionError):
+        CyclerInterface({**CYCLER_INTERFACE_CONFIG, 'port': 5999, 'timeout_s': 0.5})
+
+
+@pytest.mark.cycler_interface
+def test_load_env_credentials(tmp_path):
+    """
+    Test that each .env file gives its own credentials, however the loads are interleaved.
+    """
+    env_path_a = str(tmp_path / 'a.env')
+    env_path_b = str(tmp_path / 'b.env')
+    with open(env_path_a, 'w') as file:
+        file.write('ARBIN_CTI_USERNAME=alice\nARBIN_CTI_PASSWORD=alice_password\n')
+    with open(env_path_b, 'w') as file:
+        file.write('ARBIN_CTI_USERNAME=bob\nARBIN_CTI_PASSWORD=bob_password\n')
+
+    environ_username = os.getenv('ARBIN_CTI_USERNAME')
+
+    assert (_load_env_credentials(env_path_a) == ('alice', 'alice_password'))
+    assert (_load_env_credentials(env_path_b) == ('bob', 'bob_password'))
+    assert (_load_env_credentials(env_path_a) == ('alice', 'alice_password'))
+
+    # Reading the files leaves the process environment alone.
+    assert (os.getenv('ARBIN_CTI_USERNAME') == environ_username)
+
+
+@pytest.mark.cycler_interface
+def test_receive_msg_too_short():
+    """
+    Test that a response whose msg_length is too short to unpack is rejected and the
+    interface reconnects, rather than passing on a truncated message.
+    """
+    server_config = {'ip': '127.0.0.1', 'port': 5990}
+
+    bad_response = Msg.ChannelInfo.Server.pack()
+    struct.pack_into(MessageABC.base_template['msg_length']['format'], bad_response,
+                     MessageABC.base_template['msg_length']['start_byte'], 50)
+    good_response = Msg.ChannelInfo.Server.pack()
+    server = ScriptedArbinServer(server_config, [bad_response, good_response])
+
+    arbin_interface = CyclerInterface(
+        {'ip_address': server_config['ip'], 'port': server_config['port'], 'timeout_s': 1})
+    tx_msg = Msg.ChannelInfo.Client.pack()
+    assert (arbin_interface._send_receive_msg(tx_msg) == b'')
+    # The next request goes out on the new connection and gets a whole response.
+    assert (arbin_interface._send_receive_msg(tx_msg) ==
+            good_response[:Msg.ChannelInfo.Server.msg_length])
+    assert (server.num_connections == 2)
+
+    server.stop()
+
+
+@pytest.mark.cycler_interface
+def test_receive_msg_too_long():
+    """
+    Test that a response whose msg_length is larger than any Arbin message is rejected and
+    the interface reconnects, rather than trying to buffer it.
+    """
+    server_config = {'ip': '127.0.0.1', 'port': 5991}
+
+    bad_response = Msg.ChannelInfo.Server.pack()
+    struct.pack_into(MessageABC.base_template['msg_length']['format'], bad_response,
+                     MessageABC.base_template['msg_length']['start_byte'], MAX_MSG_LENGTH + 1)
+    good_response = Msg.ChannelInfo.Server.pack()
+    server = ScriptedArbinServer(server_config, [bad_response, good_response])
+
+    arbin_interface = CyclerInterface(
+        {'ip_address': server_config['ip'], 'port': server_config['port'], 'timeout_s': 1})
+    tx_msg = Msg.ChannelInfo.Client.pack()
+    assert (arbin_interface._send_receive_msg(tx_msg) == b'')
+    # The next request goes out on the new connection and gets a whole response.
+    assert (arbin_interface._send_receive_msg(tx_msg) ==
+            good_response[:Msg.ChannelInfo.Server.msg_length])
+    assert (server.num_connections == 2)
+
+    server.stop()
+
+
+@pytest.mark.cycler_interface
+def test_login_rejected():
+    """
+    Test that a rejected login raises a PermissionError.
+    """
+    server_config = {'ip': '127.0.0.1', 'port': 5992}
+    # Login result 2 is a failed login.
+    server = ScriptedArbinServer(server_config, login_result=2)
+
+    with pytest.raises(PermissionError):
+        CyclerInterface(
+            {'ip_address': server_config['ip'], 'port': server_config['port'], 'timeout_s': 0.5})
+
+    server.stop()
+
+
+@pytest.mark.cycler_interface
+def test_login_no_response():
+    """
+    Test that getting no login response raises a ConnectionError, not a PermissionError.
+    """
+    server_config = {'ip': '127.0.0.1', 'port': 5993}
+    server = ScriptedArbinServer(server_config, login_result=None)
+
+    with pytest.raises(ConnectionError):
+        CyclerInterface(
+            {'ip_address': server_config['ip'], 'port': server_config['port'], 'timeout_s': 0.5})
+
+    server.stop()
@@ -71,6 +71,21 @@ def test_modify_build_msg():
     assert (abc_built_msg == key_msg)
 
 
+@pytest.mark.messages
+def test_modify_build_msg_encoded_string():
+    '''
+    Test packing a message with MessageAbc.pack() and passing a string field already encoded
+    '''
+    key_msg = TestMessageClass.msg_packer()
+
+    test_string = TestMessageClass.msg_specific_template['test_string']['value']
+    test_string_encoding = TestMessageClass.msg_specific_template['test_string']['text_encoding']
+
+    update_dict = {'test_string': test_string.encode(test_string_encoding)}
+    abc_built_msg = TestMessageClass.pack(update_dict)
+    assert (abc_built_msg == key_msg)
+
+
 @pytest.mark.messages
 def test_modify_build_msg_bad_key():
     '''
@@ -116,3 +131,43 @@ def test_parse_msg():
 
     for key in ans_key_dict.keys():
         assert (ans_key_dict[key] == parsed_msg_dict[key])
+
+
+@pytest.mark.messages
+def test_verify_checksum():
+    '''
+    Test checking the trailing checksum of a message with MessageAbc.verify_checksum()
+    '''
+    key_msg = TestMessageClass.msg_packer()
+    assert (TestMessageClass.verify_checksum(key_msg))
+
+    # Corrupt a byte in the message body so the checksum no longer matches
+    bad_msg = bytearray(key_msg)
+    bad_msg[20] ^= 0xFF
+    assert (not TestMessageClass.verify_checksum(bad_msg))
+
+    assert (not TestMessageClass.verify_checksum(bytearray([0x01])))
+
+
+@pytest.mark.messages
+def test_overlapping_fields():
+    '''
+    Test that defining a message with overlapping fields fails at class creation
+    '''
+    with pytest.raises(ValueError):
+        class OverlappingMessageClass(MessageABC):
+            msg_length = 28
+            command_code = 0x02
+
+            msg_specific_template = {
+                'first_value': {
+                    'format': '<I',
+                    'start_byte': 20,
+                    'value': 0
+                },
+                'second_value': {
+                    'format': '<I',
+                    'start_byte': 22,
+                    'value': 0
+                },
+            }
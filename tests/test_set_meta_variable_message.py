@@ -1,6 +1,7 @@
 import pytest
 import os
 import copy
+import logging
 from pyctiarbin import Msg
 from helper_test_utils import message_file_loader
 
@@ -42,4 +43,16 @@ def test_set_meta_variable_server_msg():
     buildable_msg_dict['result'] = '\0'
     packed_msg = Msg.SetMetaVariable.Server.pack(buildable_msg_dict)
     parsed_msg = Msg.SetMetaVariable.Server.unpack(packed_msg)
-    assert (parsed_msg == msg_dict)
\ No newline at end of file
+    assert (parsed_msg == msg_dict)
+
+
+@pytest.mark.messages
+def test_set_meta_variable_server_unknown_result(caplog):
+    '''
+    Test that a result code missing from mv_result_decoder is decoded as Unknown and logged
+    '''
+    packed_msg = Msg.SetMetaVariable.Server.pack({'result': '\x05'})
+    with caplog.at_level(logging.WARNING, logger='pyctiarbin.messages'):
+        parsed_msg = Msg.SetMetaVariable.Server.unpack(packed_msg)
+    assert (parsed_msg['result'] == 'Unknown')
+    assert ('Unknown result code 5 for Msg.SetMetaVariable.Server message!' in caplog.text)
@@ -42,4 +42,18 @@ def test_start_schedule_server_msg():
     buildable_msg_dict['result'] = '\0'
     packed_msg = Msg.StartSchedule.Server.pack(buildable_msg_dict)
     parsed_msg = Msg.StartSchedule.Server.unpack(packed_msg)
-    assert (parsed_msg == msg_dict)
\ No newline at end of file
+    assert (parsed_msg == msg_dict)
+
+
+@pytest.mark.messages
+def test_start_schedule_server_unknown_result():
+    '''
+    Test that a result code outside the feedback codes is decoded as Unknown
+    '''
+    packed_msg = Msg.StartSchedule.Server.pack({'result': '\x05'})
+    parsed_msg = Msg.StartSchedule.Server.unpack(packed_msg)
+    assert (parsed_msg['result'] == 'Unknown')
+
+    packed_msg = Msg.StartSchedule.Server.pack({'result': '\x7f'})
+    parsed_msg = Msg.StartSchedule.Server.unpack(packed_msg)
+    assert (parsed_msg['result'] == 'Unknown')